@@ -0,0 +1,27 @@
+10 REM Expression evaluator regression cases; expected values in brackets
+20 ONERR GOTO 900
+30 A = 3: B = 4
+40 PRINT "2*-3 = "; 2*-3; " [-6]"
+50 PRINT "1E-2 = "; 1E-2; " [0.01]"
+60 PRINT "-2^2 = "; -2^2; " [4]"
+70 PRINT "2^-2 = "; 2^-2; " [0.25]"
+80 PRINT "NOT A = B = "; NOT A = B; " [0]"
+90 PRINT "NOT(0) = "; NOT(0); " [1]"
+100 PRINT "LEN(ABC)+1 = "; LEN("ABC")+1; " [4]"
+110 DEF FN F(X) = X * X
+120 PRINT "FN F(2)+1 = "; FN F(2)+1; " [5]"
+130 PRINT "A+B = "; "A" + "B"; " [AB]"
+140 PRINT "CHR$(ASC(A)+1) = "; CHR$(ASC("A")+1); " [B]"
+150 PRINT "7 MOD 3 = "; 7 MOD 3; " [1]"
+160 PRINT "-7 MOD 3 = "; -7 MOD 3; " [2]"
+170 PRINT "7 \ 2 = "; 7 \ 2; " [3]"
+180 PRINT "S$(3) = ["; S$(3); "] [[]]"
+190 DIM Q(2)
+200 PRINT "Q(5) [BAD SUBSCRIPT]": X = Q(5)
+210 PRINT "10^400 [OVERFLOW]": X = 10^400
+220 PRINT "A+1 [TYPE MISMATCH]": X = "A" + 1
+230 PRINT "1/0 [DIVISION BY ZERO]": X = 1/0
+240 PRINT "DONE"
+250 END
+900 PRINT "TRAPPED AT LINE "; PEEK(218) + PEEK(219) * 256
+910 RESUME
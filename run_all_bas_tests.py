@@ -1,8 +1,12 @@
 import json
+import os
 import pathlib
+import queue
 import subprocess
 import sys
+import threading
 import time
+from collections import deque
 
 ROOT = pathlib.Path(__file__).resolve().parent
 FILES = sorted(ROOT.rglob("*.bas"), key=lambda p: str(p))
@@ -11,53 +15,190 @@ LOG_PATH = ROOT / "test_run_summary.log"
 INPUT_TIMEOUT = "5"
 EXEC_TIMEOUT = "45"
 PROC_TIMEOUT = 55
+# Output kept per program: the first and last lines, each cut to about MAX_LINE_CHARS
+# and read in bounded pieces, so a runaway PRINT loop (with or without newlines)
+# cannot grow memory without limit
+OUTPUT_HEAD_LINES = 20
+OUTPUT_TAIL_LINES = 200
+MAX_LINE_CHARS = 4096
 
-results = []
-for idx, path in enumerate(FILES, 1):
-    start = time.time()
-    cmd = [
-        sys.executable,
-        "applesoft.py",
-        str(path),
-        "--input-timeout",
-        INPUT_TIMEOUT,
-        "--exec-timeout",
-        EXEC_TIMEOUT,
-        "--auto-close",
-    ]
-    try:
-        proc = subprocess.run(
-            cmd,
+
+# Must match WORKER_DONE_MARKER in applesoft.py
+DONE_MARKER = "__DONE__"
+WORKER_CMD = [
+    sys.executable,
+    "applesoft.py",
+    "--worker-mode",
+    "--input-timeout",
+    INPUT_TIMEOUT,
+    "--exec-timeout",
+    EXEC_TIMEOUT,
+    "--auto-close",
+]
+
+
+class Worker:
+    """A persistent applesoft.py --worker-mode process that runs one program at a time.
+
+    Keeping the process alive pays Python start-up and the pygame/numpy imports
+    once per worker instead of once per file.
+    """
+
+    def __init__(self):
+        self.proc = None
+
+    def start(self):
+        # Parallel runs must not fight over a real display
+        env = dict(os.environ)
+        env.setdefault("SDL_VIDEODRIVER", "dummy")
+        # pygame prints its banner once per process, which would land in the output of
+        # whichever program a worker happens to run first
+        env.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+        self.proc = subprocess.Popen(
+            WORKER_CMD,
             cwd=ROOT,
+            env=env,
+            stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             text=True,
-            timeout=PROC_TIMEOUT,
+            bufsize=1,
         )
-        rc = proc.returncode
-        output = proc.stdout
-    except subprocess.TimeoutExpired as exc:
-        rc = -9
-        output = (exc.stdout or "") + "\n[TIMEOUT]"
-    duration = round(time.time() - start, 2)
-    results.append(
-        {
+
+    def run(self, path: pathlib.Path) -> dict:
+        if self.proc is None or self.proc.poll() is not None:
+            self.start()
+        proc = self.proc
+        start = time.time()
+        proc.stdin.write(f"{path}\n")
+        proc.stdin.flush()
+        # A hung program is only stopped by killing its worker, which ends the read below
+        timer = threading.Timer(PROC_TIMEOUT, proc.kill)
+        timer.start()
+        head = []
+        tail = deque(maxlen=OUTPUT_TAIL_LINES)
+        dropped = 0
+        rc = None
+
+        def keep(line):
+            nonlocal dropped
+            if len(head) < OUTPUT_HEAD_LINES:
+                head.append(line)
+            else:
+                if len(tail) == OUTPUT_TAIL_LINES:
+                    dropped += 1
+                tail.append(line)
+
+        # Only a piece ending in a newline finishes a line; the rest of an over-long
+        # line is read and dropped, so it still counts once against the limits
+        line = ""
+        truncated = False
+        while True:
+            piece = proc.stdout.readline(MAX_LINE_CHARS)
+            if not piece:
+                break
+            if not line and piece.startswith(DONE_MARKER):
+                rc = int(piece.split()[1])
+                break
+            if len(line) < MAX_LINE_CHARS:
+                line += piece
+            else:
+                truncated = True
+            if piece.endswith("\n"):
+                keep(line + " [... line truncated ...]\n" if truncated else line)
+                line = ""
+                truncated = False
+        if line:
+            keep(line + " [... line truncated ...]" if truncated else line)
+        timer.cancel()
+        output = "".join(head)
+        if dropped:
+            output += f"[... {dropped} lines omitted ...]\n"
+        output += "".join(tail)
+        if rc is None:
+            timed_out = time.time() - start >= PROC_TIMEOUT
+            proc.wait()
+            proc.stdin.close()
+            proc.stdout.close()
+            self.proc = None
+            if timed_out:
+                rc = -9
+                output += "\n[TIMEOUT]"
+            else:
+                rc = proc.returncode
+        elif output.endswith("\n"):
+            # The worker starts its marker on a fresh line; that newline is not program output
+            output = output[:-1]
+        duration = round(time.time() - start, 2)
+        return {
             "file": str(path.relative_to(ROOT)),
             "rc": rc,
             "duration_sec": duration,
             "output": output,
         }
-    )
-    print(f"[{idx}/{len(FILES)}] {path} rc={rc} t={duration}s", flush=True)
-
-RESULTS_PATH.write_text(json.dumps(results, indent=2), encoding="utf-8")
-failures = [item for item in results if item["rc"] != 0]
-summary_lines = [f"Ran {len(results)} programs; failures: {len(failures)}"]
-for item in failures:
-    summary_lines.append(
-        f"FAIL {item['file']} rc={item['rc']} time={item['duration_sec']}s"
-    )
-    summary_lines.append("\n".join(item["output"].splitlines()[:5]))
-LOG_PATH.write_text("\n".join(summary_lines), encoding="utf-8")
-for line in summary_lines:
-    print(line)
+
+    def close(self):
+        if self.proc is None:
+            return
+        self.proc.stdin.close()
+        try:
+            self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        self.proc.stdout.close()
+        self.proc = None
+
+
+def main():
+    jobs = queue.Queue()
+    for item in enumerate(FILES):
+        jobs.put(item)
+    results = [None] * len(FILES)
+    progress_lock = threading.Lock()
+    finished = 0
+
+    def drain():
+        nonlocal finished
+        worker = Worker()
+        try:
+            while True:
+                try:
+                    idx, path = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                result = worker.run(path)
+                results[idx] = result
+                with progress_lock:
+                    finished += 1
+                    print(
+                        f"[{finished}/{len(FILES)}] {path} rc={result['rc']} t={result['duration_sec']}s",
+                        flush=True,
+                    )
+        finally:
+            worker.close()
+
+    threads = [
+        threading.Thread(target=drain)
+        for _ in range(min(os.cpu_count() or 1, len(FILES)))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    RESULTS_PATH.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    failures = [item for item in results if item["rc"] != 0]
+    summary_lines = [f"Ran {len(results)} programs; failures: {len(failures)}"]
+    for item in failures:
+        summary_lines.append(
+            f"FAIL {item['file']} rc={item['rc']} time={item['duration_sec']}s"
+        )
+        summary_lines.append("\n".join(item["output"].splitlines()[:5]))
+    LOG_PATH.write_text("\n".join(summary_lines), encoding="utf-8")
+    for line in summary_lines:
+        print(line)
+
+
+if __name__ == "__main__":
+    main()